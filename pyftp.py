@@ -1,42 +1,65 @@
 import argparse
-import base64
+import bisect
+import copy
 import json
 import logging
+import mmap
 import os
+import posixpath
+import queue
+import socket
+import ssl
 import sys
-import tomllib
-import xml.etree.ElementTree as ET
+import threading
+import time
 from abc import ABC, abstractmethod
-from concurrent.futures import Future, ThreadPoolExecutor
-from contextlib import AbstractContextManager
+from collections import OrderedDict, deque
+from contextlib import AbstractContextManager, contextmanager, suppress
 from dataclasses import asdict, dataclass
-from ftplib import FTP
-from typing import Generator, TypeAlias, TypedDict, cast
-
-from prompt_toolkit import HTML, print_formatted_text, prompt
-from prompt_toolkit.completion import Completer as PTKCompleter
-from prompt_toolkit.completion import Completion as PTKCompletion
-from prompt_toolkit.completion import PathCompleter as PTKPathCompleter
-from prompt_toolkit.completion.base import CompleteEvent
-from prompt_toolkit.document import Document
-from prompt_toolkit.formatted_text import FormattedText
-
-
-@dataclass(frozen=True)
+from ftplib import FTP, FTP_TLS, error_perm, error_reply, error_temp
+from functools import lru_cache
+from types import TracebackType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Callable,
+    Generator,
+    NamedTuple,
+    NotRequired,
+    TypeAlias,
+    TypedDict,
+    cast,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+    from prompt_toolkit.completion import Completer as PTKCompleter
+    from prompt_toolkit.completion import Completion as PTKCompletion
+    from prompt_toolkit.completion.base import CompleteEvent
+    from prompt_toolkit.document import Document
+
+
+@dataclass(frozen=True, slots=True)
 class FTPConfig:
     name: str
     username: str
     password: str
     host: str
     port: int
+    tls: bool = False
 
 
 class FTPConfigParser(ABC):
+    @abstractmethod
     def parse(self) -> list[FTPConfig]:
-        raise NotImplementedError()
+        ...
 
 
 class Completion:
+    __slots__ = ("_text", "_position")
+
     def __init__(self, text: str, start_position: int = 0) -> None:
         self._text = text
         self._position = start_position
@@ -53,65 +76,264 @@ class Completer(ABC):
     def get_completions(self, inp: str) -> list[Completion]:
         ...
 
+    async def get_completions_async(self, inp: str) -> list[Completion]:
+        return self.get_completions(inp)
+
+    def cancel_pending(self) -> None:
+        pass
+
+
+TRANSFER_BLOCKSIZE = 1 << 20
+
+
+class RemoteFileChangedError(Exception):
+    pass
+
+
+class DirEntry(NamedTuple):
+    name: str
+    type: str
+    size: int | None = None
+
+
+def _parse_list_line(line: str) -> DirEntry | None:
+    parts = line.split(maxsplit=8)
+    if len(parts) == 9 and line[0] in "-dl":
+        # unix style: drwxr-xr-x 2 user group 4096 Jan 01 00:00 name
+        if line[0] == "l":
+            # the listed size is the link's own, not its target's
+            return DirEntry(parts[8].split(" -> ")[0], "link")
+        if line[0] == "d":
+            return DirEntry(parts[8], "dir")
+        size = int(parts[4]) if parts[4].isdigit() else None
+        return DirEntry(parts[8], "file", size)
+    parts = line.split(maxsplit=3)
+    if len(parts) == 4:
+        # dos style: 01-01-20  12:00PM  <DIR>  name
+        if parts[2] == "<DIR>":
+            return DirEntry(parts[3], "dir")
+        if parts[2].isdigit():
+            return DirEntry(parts[3], "file", int(parts[2]))
+    return None
+
+
+def _has_mlst(ftp: FTP) -> bool:
+    # servers without MLST may reject the OPTS MLST sent before MLSD with a
+    # 501, which can't be told apart from a bad path, so ask FEAT instead
+    if isinstance(ftp, CachedTypeFTP):
+        return "MLST" in ftp.features
+    return True
+
+
+def _entry_from_facts(name: str, facts: dict[str, str]) -> DirEntry:
+    return DirEntry(
+        name,
+        facts.get("type", "").lower(),
+        int(facts["size"]) if "size" in facts else None,
+    )
+
+
+def _list_dir(ftp: FTP, dirname: str) -> list[DirEntry]:
+    if _has_mlst(ftp):
+        try:
+            entries = [
+                _entry_from_facts(name, facts)
+                for name, facts in ftp.mlsd(dirname, facts=["type", "size"])
+            ]
+            return [e for e in entries if e.type not in ("cdir", "pdir")]
+        except error_perm as exc:
+            if not str(exc).startswith(("500", "502")):
+                raise
+            logging.debug("MLSD failed, falling back to LIST: %s", exc)
+    lines: list[str] = []
+    ftp.retrlines(f"LIST {dirname}" if dirname else "LIST", lines.append)
+    return [
+        e
+        for e in map(_parse_list_line, lines)
+        if e is not None and e.name not in (".", "..")
+    ]
+
+
+class TTLDirCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 60) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict[str, tuple[float, list[DirEntry]]]()
+
+    def get(self, dirname: str) -> list[DirEntry] | None:
+        if (entry := self._entries.get(dirname)) is None:
+            return None
+        ts, ls = entry
+        if time.monotonic() - ts >= self._ttl:
+            self._entries.pop(dirname)
+            return None
+        self._entries.move_to_end(dirname)
+        return ls
+
+    def set(self, dirname: str, ls: list[DirEntry]) -> None:
+        self._entries[dirname] = (time.monotonic(), ls)
+        self._entries.move_to_end(dirname)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, dirname: str) -> bool:
+        return self.get(dirname) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"TTLDirCache({list(self._entries)})"
+
 
 class FTPPathCompleter(Completer):
     COMPLETION_PLACEHOLDER = "..."
+    PREFETCH_LIMIT = 16
+    CACHE_TTL = 30
+    CACHE_MAX_ENTRIES = 1000
 
     def __init__(self, ftp: FTP) -> None:
         self._ftp = ftp
-        self._ftp_cache: dict[str, list[str]] = dict()
-        self._ftp_reqs: dict[str, Future[list[str]]] = dict()
-        self._pool = ThreadPoolExecutor(max_workers=1)
-
-    def _get_dir_listing(self, dirname: str) -> list[str]:
-        logging.debug(f"start:\n{self._ftp_cache=}\n{self._ftp_reqs=}")
-
-        def get_files(*_, **__) -> list[str]:
+        self._ftp_cache = TTLDirCache(
+            max_entries=self.CACHE_MAX_ENTRIES, ttl=self.CACHE_TTL
+        )
+        # (dirname, prefetch) jobs; only user requested listings prefetch
+        self._jobs: queue.Queue[tuple[str, bool] | None] = queue.Queue()
+        self._done: dict[str, threading.Event] = dict()
+        self._lock = threading.Lock()
+        # set while cancel_pending() waits, so the worker queues no prefetches
+        self._cancelled = False
+        # listing of the last completed dirname, reused until the prompt ends
+        self._last_listing: tuple[str, list[DirEntry]] | None = None
+        self._worker_thread = threading.Thread(target=self._worker, daemon=True)
+        self._worker_thread.start()
+
+    def _worker(self) -> None:
+        while (job := self._jobs.get()) is not None:
+            dirname, prefetch = job
             try:
-                ftp = self._ftp
-                ftp.cwd(dirname)
-                ls = ftp.nlst()
-                logging.debug(f"get_files: {ls}")
-                return ls
+                ls = _list_dir(self._ftp, dirname)
+                logging.debug("get_files: %s", ls)
             except Exception as exc:
                 logging.error(str(exc))
-                raise
+                ls = None
+            with self._lock:
+                if ls is not None:
+                    ls.sort(key=lambda e: e.name)
+                    self._ftp_cache.set(dirname, ls)
+                    if not prefetch and not self._cancelled:
+                        self._prefetch_dir_listings(dirname, ls)
+                if (event := self._done.pop(dirname, None)) is not None:
+                    event.set()
+
+    def _submit_dir_listing(
+        self, dirname: str, prefetch: bool = False
+    ) -> threading.Event:
+        if dirname not in self._done:
+            self._done[dirname] = threading.Event()
+            self._jobs.put((dirname, prefetch))
+        return self._done[dirname]
+
+    def _get_dir_listing(self, dirname: str) -> list[DirEntry]:
+        with self._lock:
+            logging.debug(
+                "start:\ncache=%r\nreqs=%r", self._ftp_cache, self._done
+            )
+            if (ls := self._ftp_cache.get(dirname)) is not None:
+                return ls
+            if not self._is_known_non_dir(dirname):
+                self._submit_dir_listing(dirname)
+            return []
 
-        if dirname not in self._ftp_reqs:
-            self._ftp_reqs[dirname] = self._pool.submit(get_files)
-        executor = self._ftp_reqs[dirname]
-        ls = self._ftp_cache.setdefault(dirname, [])
-        if not executor.done():
-            logging.debug(f"executing:\n{self._ftp_cache=}\n{self._ftp_reqs=}")
-            return ls
-        self._ftp_reqs.pop(dirname)
-        if executor.exception() is not None:
-            ls = self._ftp_cache.pop(dirname)
-            return ls
-        if (result := executor.result()) is not None:
-            self._ftp_cache[dirname] = result
-        logging.debug(f"end:\n{self._ftp_cache=}\n{self._ftp_reqs=}")
-        return self._ftp_cache[dirname]
+    def _is_known_non_dir(self, dirname: str) -> bool:
+        # answer from the cached parent listing instead of asking the server
+        parent, name = self._split_path(dirname)
+        if name in ("", ".", ".."):
+            return False
+        parent_ls = self._ftp_cache.get(parent)
+        if parent_ls is None:
+            return False
+        i = bisect.bisect_left(parent_ls, (name,))
+        if i == len(parent_ls) or parent_ls[i].name != name:
+            return True
+        return parent_ls[i].type == "file"
+
+    def _prefetch_dir_listings(self, dirname: str, ls: list[DirEntry]) -> None:
+        for entry in ls:
+            if self._jobs.qsize() >= self.PREFETCH_LIMIT:
+                break
+            if entry.type not in ("dir", "link", ""):
+                continue
+            path = posixpath.join(dirname, entry.name)
+            if path in self._ftp_cache or path in self._done:
+                continue
+            self._submit_dir_listing(path, prefetch=True)
+
+    def _drain_jobs(self) -> None:
+        with self._lock, suppress(queue.Empty):
+            while (job := self._jobs.get_nowait()) is not None:
+                self._done.pop(job[0]).set()
+
+    def cancel_pending(self) -> None:
+        self._last_listing = None
+        with self._lock:
+            self._cancelled = True
+        # the caller reuses the control connection once this returns, so the
+        # worker must be idle, not just have an empty queue
+        while True:
+            self._drain_jobs()
+            with self._lock:
+                pending = list(self._done.values())
+                if not pending:
+                    self._cancelled = False
+                    break
+            for event in pending:
+                event.wait()
+
+    def clear_cache(self) -> None:
+        self._last_listing = None
+        with self._lock:
+            self._ftp_cache.clear()
+
+    def close(self) -> None:
+        self._drain_jobs()
+        self._jobs.put(None)
+        self._worker_thread.join()
+        self._done.clear()
+
+    def _split_path(self, path: str) -> tuple[str, str]:
+        # same result as posixpath.split for the paths typed at the prompt
+        head, sep, basename = path.rpartition("/")
+        return head.rstrip("/") or sep, basename
 
     def _remove_placeholder(self, fname: str) -> str:
-        return fname.strip(self.COMPLETION_PLACEHOLDER)
+        return fname.removesuffix(self.COMPLETION_PLACEHOLDER)
 
     def _get_completions_starting_with(
-        self, word: str, ls: list[str]
-    ) -> list[str]:
-        return list(filter(lambda f: f.startswith(word), ls))
+        self, word: str, ls: list[DirEntry]
+    ) -> Generator[str, None, None]:
+        lo = bisect.bisect_left(ls, (word,))
+        hi = bisect.bisect_right(ls, (word + "\U0010ffff",), lo=lo)
+        for i in range(lo, hi):
+            yield ls[i].name
 
     def _get_completion_replace_length(self, path: str) -> int:
-        return len(os.path.basename(path))
+        return len(path.rpartition("/")[2])
 
     def _path_has_placeholder(self, path: str) -> bool:
         return path.endswith(self.COMPLETION_PLACEHOLDER)
 
     def get_completions(self, inp: str) -> list[Completion]:
         path = inp
-        dirname = os.path.dirname(path)
-        basename = self._remove_placeholder(os.path.basename(path))
-        ls = self._get_dir_listing(dirname)
+        dirname, basename = self._split_path(path)
+        basename = self._remove_placeholder(basename)
+        if self._last_listing is not None and self._last_listing[0] == dirname:
+            ls = self._last_listing[1]
+        elif ls := self._get_dir_listing(dirname):
+            self._last_listing = (dirname, ls)
         if not ls and self._path_has_placeholder(path):
             return []
         elif not ls:
@@ -120,19 +342,45 @@ class FTPPathCompleter(Completer):
             ]
         else:
             to_return = []
+            length = self._get_completion_replace_length(path)
             for f in self._get_completions_starting_with(basename, ls):
-                length = self._get_completion_replace_length(path)
                 to_return.append(
                     Completion(f.replace(r" ", r"\ "), length * -1)
                 )
             return to_return
 
+    async def get_completions_async(self, inp: str) -> list[Completion]:
+        import asyncio
+
+        dirname, _ = self._split_path(inp)
+        with self._lock:
+            event = (
+                None
+                if dirname in self._ftp_cache or self._is_known_non_dir(dirname)
+                else self._submit_dir_listing(dirname)
+            )
+        if event is not None:
+            await asyncio.to_thread(event.wait)
+        return self.get_completions(inp)
+
+
+# the agent serves invocations from different directories on its threads
+_thread_cwd = threading.local()
+
+
+def _local_cwd() -> str:
+    return getattr(_thread_cwd, "path", None) or os.getcwd()
+
 
 class PathCompleter(Completer):
     def get_completions(self, inp) -> list[Completion]:
+        from prompt_toolkit.completion import PathCompleter as PTKPathCompleter
+        from prompt_toolkit.completion.base import CompleteEvent
+        from prompt_toolkit.document import Document
+
         document = Document(inp, len(inp))
         event = CompleteEvent(text_inserted=False, completion_requested=True)
-        completer = PTKPathCompleter()
+        completer = PTKPathCompleter(get_paths=lambda: [_local_cwd()])
         completions = []
         for c in completer.get_completions(document, event):
             completions.append(
@@ -141,13 +389,25 @@ class PathCompleter(Completer):
         return completions
 
 
-class CompleterAdaptor(PTKCompleter):
+class WordCompleter(Completer):
+    def __init__(self, words: list[str]) -> None:
+        self._words = words
+
+    def get_completions(self, inp: str) -> list[Completion]:
+        return [
+            Completion(w, -len(inp)) for w in self._words if w.startswith(inp)
+        ]
+
+
+class CompleterAdaptor:
     def __init__(self, completer: Completer) -> None:
         self._completer = completer
 
     def get_completions(
-        self, document: Document, complete_event: CompleteEvent
-    ) -> Generator[PTKCompletion, None, None]:
+        self, document: "Document", complete_event: "CompleteEvent"
+    ) -> Generator["PTKCompletion", None, None]:
+        from prompt_toolkit.completion import Completion as PTKCompletion
+
         completions = self._completer.get_completions(document.text)
         for c in completions:
             yield PTKCompletion(
@@ -155,6 +415,18 @@ class CompleterAdaptor(PTKCompleter):
                 start_position=c.start_position(),
             )
 
+    async def get_completions_async(
+        self, document: "Document", complete_event: "CompleteEvent"
+    ) -> AsyncGenerator["PTKCompletion", None]:
+        from prompt_toolkit.completion import Completion as PTKCompletion
+
+        completions = await self._completer.get_completions_async(document.text)
+        for c in completions:
+            yield PTKCompletion(
+                c.text(),
+                start_position=c.start_position(),
+            )
+
 
 Choice: TypeAlias = int
 
@@ -184,28 +456,34 @@ class UI(ABC):
         ...
 
 
-class CommandLineUI(ABC):
+def _choice_menu(ui: UI, ls: list[str], title: str, prompt_str: str) -> Choice:
+    # one write for the whole menu instead of one per line
+    lines = [title, *(f"{i}. {item}" for i, item in enumerate(ls, 1))]
+    ui.print_msg("\n".join(lines), color="blue")
+    n = len(ls)
+    while True:
+        choice = ui.prompt_user(prompt_str).strip()
+        if not choice.isdecimal():
+            continue
+        choice_int = int(choice)
+        if not 1 <= choice_int <= n:
+            ui.print_error(f"Please enter between 1 and {n}")
+            continue
+        return choice_int - 1
+
+
+class CommandLineUI(UI):
     def display_choice_menu(
         self,
         ls: list[str],
         title: str = "",
         prompt_str: str = "Enter your choice: ",
     ) -> Choice:
-        self.print_msg(title, color="blue")
-        for i, item in enumerate(ls, 1):
-            self.print_msg(f"{i}. {item}", color="blue")
-        while True:
-            choice = self.prompt_user(prompt_str)
-            try:
-                choice_int = int(choice)
-                if choice_int > len(ls) or choice_int < 1:
-                    self.print_error(f"Please enter between 1 and {len(ls)}")
-                    continue
-                return choice_int - 1
-            except Exception:
-                continue
+        return _choice_menu(self, ls, title, prompt_str)
 
-    def prompt_user(self, prompt_str: str) -> str:
+    def prompt_user(
+        self, prompt_str: str, completer: Completer | None = None
+    ) -> str:
         return input(prompt_str)
 
     def print_error(self, msg: str) -> None:
@@ -222,34 +500,36 @@ class PromptToolkitUI(UI):
         title: str = "",
         prompt_str: str = "Enter your choice: ",
     ) -> Choice:
-        self.print_msg(title, color="blue")
-        for i, item in enumerate(ls, 1):
-            self.print_msg(f"{i}. {item}", color="blue")
-        while True:
-            choice = self.prompt_user(prompt_str)
-            try:
-                choice_int = int(choice)
-                if choice_int > len(ls) or choice_int < 1:
-                    self.print_error(f"Please enter between 1 and {len(ls)}")
-                    continue
-                return choice_int - 1
-            except Exception:
-                continue
+        return _choice_menu(self, ls, title, prompt_str)
 
     def prompt_user(
         self, prompt_str: str, completer: Completer | None = None
     ) -> str:
+        from prompt_toolkit import prompt
+
         completer_adapter = (
             CompleterAdaptor(completer) if completer is not None else None
         )
-        return prompt(
-            prompt_str, completer=completer_adapter, complete_while_typing=False
-        )
+        try:
+            return prompt(
+                prompt_str,
+                completer=cast("PTKCompleter | None", completer_adapter),
+                complete_while_typing=False,
+            )
+        finally:
+            if completer is not None:
+                completer.cancel_pending()
 
     def print_error(self, msg: str) -> None:
-        print_formatted_text(HTML(f"<ansired>{msg}</ansired>"))
+        from prompt_toolkit import print_formatted_text
+        from prompt_toolkit.formatted_text import FormattedText
+
+        print_formatted_text(FormattedText([("ansired", msg)]))
 
     def print_msg(self, msg: str, color: str = "") -> None:
+        from prompt_toolkit import print_formatted_text
+        from prompt_toolkit.formatted_text import FormattedText
+
         print_formatted_text(
             FormattedText(
                 [
@@ -267,6 +547,8 @@ class PasswordDecoder(ABC):
 
 class Base64PasswordDecoder(PasswordDecoder):
     def decode(self, password: str) -> str:
+        import base64
+
         return base64.b64decode(password).decode("utf-8")
 
 
@@ -277,6 +559,7 @@ class UnknownPasswordDecoder(PasswordDecoder):
 
 class PasswordDecoderFactory:
     @classmethod
+    @lru_cache(maxsize=None)
     def get_decoder(cls, encoding: str) -> PasswordDecoder:
         match encoding:
             case "base64":
@@ -285,11 +568,79 @@ class PasswordDecoderFactory:
                 return UnknownPasswordDecoder()
 
 
+@lru_cache(maxsize=512)
+def _decode_password(encoding: str, password: str) -> str:
+    decoder = PasswordDecoderFactory.get_decoder(encoding)
+    return decoder.decode(password=password)
+
+
+CONFIG_CACHE_DIR = os.path.expanduser("~/.cache/pyftp")
+# bump whenever FTPConfig or a parser changes what it produces
+CONFIG_CACHE_VERSION = 1
+
+
+# parsed configs of this process keyed by absolute path, with their stat key
+_parsed_configs: dict[str, tuple[tuple[int, int, int], list[FTPConfig]]] = {}
+
+
+def _load_cached(
+    path: str, parse_fn: Callable[[], list[FTPConfig]]
+) -> list[FTPConfig]:
+    st = os.stat(path)
+    key = (CONFIG_CACHE_VERSION, st.st_mtime_ns, st.st_size)
+    abspath = os.path.abspath(path)
+    memo = _parsed_configs.get(abspath)
+    if memo is None or memo[0] != key:
+        memo = (key, _load_disk_cached(abspath, key, parse_fn))
+        _parsed_configs[abspath] = memo
+    return list(memo[1])
+
+
+def _load_disk_cached(
+    path: str,
+    key: tuple[int, int, int],
+    parse_fn: Callable[[], list[FTPConfig]],
+) -> list[FTPConfig]:
+    import hashlib
+    import pickle
+    import tempfile
+
+    digest = hashlib.sha1(path.encode()).hexdigest()
+    cache_path = os.path.join(CONFIG_CACHE_DIR, f"{digest}.pkl")
+    try:
+        with open(cache_path, "rb") as reader:
+            if pickle.load(reader) == key:
+                return cast(list[FTPConfig], pickle.load(reader))
+    except FileNotFoundError:
+        pass
+    except Exception as exc:
+        logging.debug(
+            "Ignoring unreadable config cache %s: %s", cache_path, exc
+        )
+    configs = parse_fn()
+    try:
+        os.makedirs(CONFIG_CACHE_DIR, mode=0o700, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=CONFIG_CACHE_DIR, delete=False
+        ) as writer:
+            pickle.dump(key, writer)
+            pickle.dump(configs, writer)
+        os.replace(writer.name, cache_path)
+    except OSError as exc:
+        logging.debug("Failed to write config cache %s: %s", cache_path, exc)
+    return configs
+
+
 class TomlFTPConfigParser(FTPConfigParser):
     def __init__(self, filename: str = "ftpconfig.toml") -> None:
         self._fname = filename
 
     def parse(self) -> list[FTPConfig]:
+        return _load_cached(self._fname, self._parse)
+
+    def _parse(self) -> list[FTPConfig]:
+        import tomllib
+
         with open(self._fname, "rb") as fd:
             data = tomllib.load(fd)
         configs = []
@@ -301,34 +652,34 @@ class TomlFTPConfigParser(FTPConfigParser):
                     password=server["password"],
                     host=server["host"],
                     port=int(server["port"]),
+                    tls=bool(server.get("tls", False)),
                 )
             )
         return configs
 
 
+FILEZILLA_PROTOCOL_FTPES = "4"
+
+
 class FileZillaFTPConfigParser(FTPConfigParser):
     def __init__(self, filename: str = "FileZilla.xml") -> None:
         self._fname = filename
 
     def _decode_password(self, encoding: str, password: str) -> str:
-        decoder = PasswordDecoderFactory.get_decoder(encoding)
-        return decoder.decode(password=password)
+        return _decode_password(encoding, password)
 
     def parse(self) -> list[FTPConfig]:
-        tree = ET.parse(self._fname)
-        root = tree.getroot()
+        return _load_cached(self._fname, self._parse)
+
+    def _parse(self) -> list[FTPConfig]:
         servers: list[FTPConfig] = list()
 
-        def get_value(element: ET.Element | None) -> str:
+        def get_value(element: Any) -> str:
             return "" if element is None else (element.text or "")
 
-        for server in root.iter("Server"):
-            name = get_value(server.find("Name"))
-            username = get_value(server.find("User"))
-            host = get_value(server.find("Host"))
-            port = get_value(server.find("Port"))
-            password_node = server.find("Pass")
-            if (password_node := server.find("Pass")) is None:
+        for server in _iter_filezilla_servers(self._fname):
+            fields = {child.tag: child for child in server}
+            if (password_node := fields.get("Pass")) is None:
                 password = ""
             else:
                 password = self._decode_password(
@@ -337,44 +688,358 @@ class FileZillaFTPConfigParser(FTPConfigParser):
                 )
             servers.append(
                 FTPConfig(
-                    name=name,
-                    username=username,
+                    name=get_value(fields.get("Name")),
+                    username=get_value(fields.get("User")),
                     password=password,
-                    host=host,
-                    port=int(port),
+                    host=get_value(fields.get("Host")),
+                    port=int(get_value(fields.get("Port"))),
+                    tls=get_value(fields.get("Protocol"))
+                    == FILEZILLA_PROTOCOL_FTPES,
                 )
             )
         return servers
 
 
+def _iter_filezilla_servers(fname: str) -> Generator[Any, None, None]:
+    import importlib
+
+    # imported by name: lxml ships no type stubs and is optional anyway
+    try:
+        etree = importlib.import_module("lxml.etree")
+    except ImportError:
+        yield from _iter_filezilla_servers_stdlib(fname)
+        return
+    for _, server in etree.iterparse(
+        fname, events=("end",), tag="Server", recover=True
+    ):
+        yield server
+        server.clear()
+        while server.getprevious() is not None:
+            del server.getparent()[0]
+
+
+def _iter_filezilla_servers_stdlib(fname: str) -> Generator[Any, None, None]:
+    import xml.etree.ElementTree as ET
+
+    parents: list[ET.Element] = []
+    for event, server in ET.iterparse(fname, events=("start", "end")):
+        if event == "start":
+            parents.append(server)
+            continue
+        parents.pop()
+        if server.tag != "Server":
+            continue
+        yield server
+        server.clear()
+        if parents:
+            parents[-1].remove(server)
+
+
+@lru_cache(maxsize=None)
+def _ssl_context() -> ssl.SSLContext:
+    return ssl.create_default_context()
+
+
+class CachedTypeFTP(FTP):
+    # commands whose effect persists for the session and need not be resent
+    STICKY_COMMANDS = ("TYPE ", "OPTS MLST ")
+
+    def connect(
+        self,
+        host: str = "",
+        port: int = 0,
+        timeout: float = -999,
+        source_address: tuple[str, int] | None = None,
+    ) -> str:
+        self._sticky: dict[str, str] = {}
+        self._features: frozenset[str] | None = None
+        resp = super().connect(host, port, timeout, source_address)
+        assert self.sock is not None
+        # pipelined commands are small writes that Nagle would hold back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return resp
+
+    @property
+    def features(self) -> frozenset[str]:
+        if self._features is None:
+            try:
+                lines = self.sendcmd("FEAT").splitlines()[1:-1]
+            except error_perm:
+                lines = []
+            self._features = frozenset(
+                line.split()[0].upper() for line in lines if line.strip()
+            )
+        return self._features
+
+    def _pret(self, cmd: str) -> None:
+        # lets distributed servers pick the data node before PASV
+        if "PRET" in self.features:
+            self.voidcmd(f"PRET {cmd}")
+
+    def ntransfercmd(
+        self, cmd: str, rest: int | str | None = None
+    ) -> tuple[socket.socket, int | None]:
+        self._pret(cmd)
+        return super().ntransfercmd(cmd, rest)
+
+    def _sticky_prefix(self, cmd: str) -> str | None:
+        for prefix in self.STICKY_COMMANDS:
+            if cmd.startswith(prefix):
+                return prefix
+        return None
+
+    def sendcmd(self, cmd: str) -> str:
+        if (prefix := self._sticky_prefix(cmd)) is None:
+            return super().sendcmd(cmd)
+        if self._sticky.get(prefix) == cmd:
+            return "200 Already set"
+        resp = super().sendcmd(cmd)
+        self._sticky[prefix] = cmd
+        return resp
+
+    def voidcmd(self, cmd: str) -> str:
+        if (prefix := self._sticky_prefix(cmd)) is None:
+            return super().voidcmd(cmd)
+        if self._sticky.get(prefix) == cmd:
+            return "200 Already set"
+        resp = super().voidcmd(cmd)
+        self._sticky[prefix] = cmd
+        return resp
+
+
+class TLSSessionFTP(CachedTypeFTP, FTP_TLS):
+    _sessions: dict[str, ssl.SSLSession] = {}
+    # set by FTP_TLS.prot_p()/prot_c(), missing from the stubs
+    _prot_p: bool
+
+    def auth(self) -> str:
+        resp = self.voidcmd("AUTH TLS")
+        assert self.sock is not None
+        self.sock = self.context.wrap_socket(
+            self.sock,
+            server_hostname=self.host,
+            session=self._sessions.get(self.host),
+        )
+        self.file = self.sock.makefile(mode="r", encoding=self.encoding)
+        return resp
+
+    def login(
+        self,
+        user: str = "",
+        passwd: str = "",
+        acct: str = "",
+        secure: bool = True,
+    ) -> str:
+        resp = super().login(user, passwd, acct, secure)
+        if isinstance(self.sock, ssl.SSLSocket) and self.sock.session:
+            self._sessions[self.host] = self.sock.session
+        return resp
+
+    def ntransfercmd(
+        self, cmd: str, rest: int | str | None = None
+    ) -> tuple[socket.socket, int | None]:
+        self._pret(cmd)
+        conn, size = FTP.ntransfercmd(self, cmd, rest)
+        if self._prot_p:
+            conn = self.context.wrap_socket(
+                conn,
+                server_hostname=self.host,
+                session=cast(ssl.SSLSocket, self.sock).session,
+            )
+        return conn, size
+
+
 class FTPClient(AbstractContextManager):
     def __init__(self, ftpconfig: FTPConfig | None) -> None:
         self._ftpconfig = ftpconfig
         self._ftp: FTP | None = None
+        self._completer: FTPPathCompleter | None = None
+        self._pool: FTPConnectionPool | None = None
+
+    @property
+    def ftp(self) -> FTP:
+        if self._ftp is None:
+            raise Exception("FTPClient is not connected")
+        return self._ftp
+
+    @property
+    def completer(self) -> FTPPathCompleter:
+        if self._completer is None:
+            self._completer = FTPPathCompleter(self.ftp)
+        return self._completer
+
+    @property
+    def pool(self) -> "FTPConnectionPool":
+        if self._pool is None:
+            self._pool = FTPConnectionPool(self._ftpconfig)
+        return self._pool
 
     def __enter__(self) -> FTP:
         if self._ftpconfig is None:
             raise Exception("FTPClient initialized with null config")
-        ftp = FTP(self._ftpconfig.host)
-        ftp.login(
-            user=self._ftpconfig.username, passwd=self._ftpconfig.password
-        )
+        if self._ftpconfig.tls:
+            ftp: FTP = TLSSessionFTP(context=_ssl_context())
+        else:
+            ftp = CachedTypeFTP()
+        try:
+            ftp.connect(self._ftpconfig.host, self._ftpconfig.port)
+            ftp.login(
+                user=self._ftpconfig.username,
+                passwd=self._ftpconfig.password,
+            )
+            if isinstance(ftp, FTP_TLS):
+                ftp.prot_p()
+            ftp.voidcmd("TYPE I")
+        except Exception:
+            ftp.close()
+            raise
         self._ftp = ftp
         return ftp
 
+    def close(self) -> None:
+        # after a failed command replies may still be pending, so drop the
+        # session without waiting on a QUIT reply
+        if self._ftp is not None:
+            self._ftp.close()
+            self._ftp = None
+        self.__exit__(None, None, None)
+
+    def reconnect(self) -> None:
+        self.close()
+        self.__enter__()
+
+    def keepalive(self) -> None:
+        self.ftp.voidcmd("NOOP")
+        if self._pool is not None:
+            self._pool.keepalive()
+
     def __exit__(self, exc_type, exc_value, traceback) -> None:
         logging.debug("called __exit__()")
+        if self._completer is not None:
+            self._completer.close()
+        self._completer = None
+        if self._pool is not None:
+            self._pool.__exit__(exc_type, exc_value, traceback)
+        self._pool = None
         if self._ftp is not None:
-            self._ftp.quit()
+            try:
+                self._ftp.quit()
+            except Exception as exc:
+                logging.debug("QUIT failed, closing connection: %s", exc)
+                self._ftp.close()
         self._ftp = None
 
 
+class FTPConnectionPool(AbstractContextManager["FTPConnectionPool"]):
+    RETRY_DELAY = 5
+
+    def __init__(self, ftpconfig: FTPConfig | None, size: int = 4) -> None:
+        self._ftpconfig = ftpconfig
+        self._size = size
+        self._clients: list[FTPClient] = []
+        self._idle: deque[FTP] = deque()
+        self._opening = 0
+        self._open_failed_at = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _can_open(self) -> bool:
+        live = len(self._clients) + self._opening
+        if live >= self._size:
+            return False
+        # after a refused login share the live connections for a while
+        # instead of hammering the server, but retry once that has passed
+        elapsed = time.monotonic() - self._open_failed_at
+        return live == 0 or elapsed >= self.RETRY_DELAY
+
+    def _acquire(self) -> FTP:
+        while True:
+            with self._cond:
+                while not self._idle:
+                    if self._can_open():
+                        self._opening += 1
+                        break
+                    self._cond.wait()
+                else:
+                    return self._idle.popleft()
+            client = FTPClient(self._ftpconfig)
+            try:
+                ftp = client.__enter__()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._open_failed_at = time.monotonic()
+                    self._cond.notify_all()
+                    # nothing to share, fail just this checkout
+                    if (live := len(self._clients) + self._opening) == 0:
+                        raise
+                logging.debug("Sharing the %d pooled ftp connections", live)
+                continue
+            with self._cond:
+                self._opening -= 1
+                self._clients.append(client)
+            return ftp
+
+    def _release(self, ftp: FTP) -> None:
+        with self._cond:
+            self._idle.append(ftp)
+            self._cond.notify()
+
+    def _discard(self, ftp: FTP) -> None:
+        # a failed transfer may leave an unread reply on the control channel
+        with self._cond:
+            self._clients = [c for c in self._clients if c._ftp is not ftp]
+            self._cond.notify()
+        ftp.close()
+
+    def keepalive(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for ftp in idle:
+            try:
+                ftp.voidcmd("NOOP")
+            except Exception as exc:
+                logging.debug("dropping dead pooled connection: %s", exc)
+                self._discard(ftp)
+                continue
+            self._release(ftp)
+
+    @contextmanager
+    def connection(self) -> Generator[FTP, None, None]:
+        ftp = self._acquire()
+        try:
+            yield ftp
+        except BaseException:
+            self._discard(ftp)
+            raise
+        self._release(ftp)
+
+    def __enter__(self) -> "FTPConnectionPool":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        logging.debug("called __exit__()")
+        for client in self._clients:
+            client.__exit__(exc_type, exc_value, traceback)
+        self._clients = []
+        self._idle.clear()
+
+
 def split(s: str) -> list[str]:
     ls = []
     cur: list[str] = []
     for c in s:
         if c == " ":
-            if cur[-1] == "\\":
+            if cur and cur[-1] == "\\":
                 cur.pop(-1)
                 cur.append(c)
             else:
@@ -385,143 +1050,421 @@ def split(s: str) -> list[str]:
         else:
             cur.append(c)
     ls.append("".join(cur))
-    logging.debug(f"split {ls=}")
+    logging.debug("split ls=%r", ls)
     return ls
 
 
+def _split_args(inp: str) -> list[str]:
+    return [arg for arg in split(inp) if arg]
+
+
+def _single_arg(inp: str, name: str, default: str | None = None) -> str:
+    args = _split_args(inp)
+    if not args and default is not None:
+        return default
+    if len(args) != 1:
+        raise Exception(f"Expected exactly one {name}, got {len(args)}")
+    return args[0]
+
+
+FTPCommand: TypeAlias = Callable[[UI, FTPClient], None]
+
+
+def _run_ftp_command(command: FTPCommand, args: argparse.Namespace) -> None:
+    if _run_via_agent(command, args):
+        return
+    ftp_client = FTPClient(get_selected_ftp_config())
+    with ftp_client:
+        command(args.ui, ftp_client)
+
+
+def _ftp_ls(ui: UI, ftp_client: FTPClient) -> None:
+    inp = ui.prompt_user("path: ", completer=ftp_client.completer)
+    paths = _split_args(inp) or ["/"]
+    path = " ".join(paths)
+    try:
+        files = [e.name for e in _list_dir(ftp_client.ftp, path)]
+    except error_perm:
+        # MLSD only lists directories, NLST also accepts a plain file
+        files = ftp_client.ftp.nlst(path)
+    # terminal default colour, the UI would otherwise force white text
+    ui.print_msg(str(files), color="default")
+
+
 def ftp_ls(args: argparse.Namespace) -> None:
-    with FTPClient(get_selected_ftp_config()) as ftp:
-        parser = argparse.ArgumentParser()
-        parser.add_argument("path", nargs="*", default="/")
-        inp = args.ui.prompt_user("path: ", completer=FTPPathCompleter(ftp))
-        ls_args = parser.parse_args(split(inp))
-        files = ftp.nlst(" ".join(ls_args.path))
-        print(files)
+    _run_ftp_command(_ftp_ls, args)
 
 
-def _is_file(ftp: FTP, f: str) -> bool:
+def _remote_size(ftp: FTP, remote_path: str) -> int | None:
     try:
-        ftp.size(f)
-        return True
-    except Exception:
-        return False
+        ftp.voidcmd("TYPE I")
+        return ftp.size(remote_path)
+    except error_perm as exc:
+        logging.debug("SIZE %s failed: %s", remote_path, exc)
+        return None
 
 
-def ftp_download(args: argparse.Namespace) -> None:
-    with FTPClient(get_selected_ftp_config()) as ftp:
-        ftp_path_parser = argparse.ArgumentParser()
-        ftp_path_parser.add_argument("ftp_path")
-        inp = args.ui.prompt_user("ftp path: ", completer=FTPPathCompleter(ftp))
-        ftp_path_args = ftp_path_parser.parse_args(split(inp))
-        local_path_parser = argparse.ArgumentParser()
-        local_path_parser.add_argument(
-            "local_path",
-            default=os.getcwd(),
-            help=(
-                "local dir where the specified ftp file must be downloaded. "
-                + "Default is current working dir"
-            ),
-        )
-        inp = args.ui.prompt_user("local path: ", completer=PathCompleter())
-        local_path_args = local_path_parser.parse_args(split(inp))
-        dirname = os.path.dirname(ftp_path_args.ftp_path)
-        filename = os.path.basename(ftp_path_args.ftp_path)
-        dest_dir = os.path.abspath(local_path_args.local_path)
-        if _is_file(ftp, ftp_path_args.ftp_path):
-            with open(os.path.join(dest_dir, filename), "wb") as fd:
-                ftp.retrbinary(f"RETR {ftp_path_args.ftp_path}", fd.write)
+def _stat(ftp: FTP, path: str) -> DirEntry | None:
+    name = posixpath.basename(path)
+    if _has_mlst(ftp):
+        try:
+            # 250-Listing path / " type=file;size=42; path" / 250 End
+            resp = ftp.sendcmd(f"MLST {path}")
+        except error_perm as exc:
+            if not str(exc).startswith(("500", "502")):
+                return None
+        else:
+            facts, _, _ = resp.splitlines()[1].strip().partition(" ")
+            return _entry_from_facts(
+                name,
+                dict(
+                    fact.split("=", 1)
+                    for fact in facts.split(";")
+                    if "=" in fact
+                ),
+            )
+    # SIZE answers for files in one round trip, dirs need the parent listing
+    if (size := _remote_size(ftp, path)) is not None:
+        return DirEntry(name, "file", size)
+    entries = _list_dir(ftp, posixpath.dirname(path))
+    return next((e for e in entries if e.name == name), None)
+
+
+SIZE_BATCH = 64
+
+
+def _remote_sizes(ftp: FTP, remote_paths: list[str]) -> dict[str, int | None]:
+    sizes: dict[str, int | None] = {}
+    ftp.voidcmd("TYPE I")
+    for i in range(0, len(remote_paths), SIZE_BATCH):
+        batch = remote_paths[i : i + SIZE_BATCH]
+        # pipeline the SIZE commands and read the replies back in order
+        for remote_path in batch:
+            ftp.putcmd(f"SIZE {remote_path}")
+        for remote_path in batch:
+            try:
+                resp = ftp.getresp()
+            except (error_perm, error_temp, error_reply) as exc:
+                logging.debug("SIZE %s failed: %s", remote_path, exc)
+                sizes[remote_path] = None
+                continue
+            size = resp[3:].strip()
+            sizes[remote_path] = int(size) if size.isdigit() else None
+    return sizes
+
+
+def _preallocate(fd: int, size: int) -> None:
+    # reserve the extents up front instead of growing a sparse file
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
             return
-        # maybe a directory
-        ftp.cwd(dirname)
-        ls = ftp.nlst()
-        if filename not in ls:
-            raise Exception(f"No such file/dir in FTP path: {dirname}")
-        dirs = [
-            (dest_dir, ftp_path_args.ftp_path),
+        except OSError as exc:
+            logging.debug("posix_fallocate failed: %s", exc)
+    os.ftruncate(fd, size)
+
+
+def _download_into_mmap(ftp: FTP, remote_path: str, fd: int, size: int) -> None:
+    _preallocate(fd, size)
+    offset = 0
+    try:
+        ftp.voidcmd("TYPE I")
+        with mmap.mmap(fd, size) as mm, memoryview(mm) as mv:
+            with ftp.transfercmd(f"RETR {remote_path}") as conn:
+                while offset < size:
+                    # released explicitly so an error can't pin the mmap
+                    with mv[offset : offset + TRANSFER_BLOCKSIZE] as chunk:
+                        n = conn.recv_into(chunk)
+                    if n == 0:
+                        break
+                    offset += n
+                grew = offset == size and bool(conn.recv(1))
+                if not grew and isinstance(conn, ssl.SSLSocket):
+                    conn.unwrap()
+        if grew:
+            # the data connection was closed early, read the server's 426 or
+            # 226 so the control connection stays in sync
+            with suppress(error_perm, error_temp, error_reply):
+                ftp.voidresp()
+            raise RemoteFileChangedError(f"{remote_path} grew during download")
+        ftp.voidresp()
+    finally:
+        # short or aborted transfer: drop the preallocated tail of zeros
+        if offset < size:
+            os.ftruncate(fd, offset)
+
+
+def _download_stream(ftp: FTP, remote_path: str, fd: int) -> None:
+    ftp.voidcmd("TYPE I")
+    buf = bytearray(TRANSFER_BLOCKSIZE)
+    with memoryview(buf) as mv:
+        with ftp.transfercmd(f"RETR {remote_path}") as conn:
+            while n := conn.recv_into(mv):
+                chunk = mv[:n]
+                while chunk:
+                    chunk = chunk[os.write(fd, chunk) :]
+            if isinstance(conn, ssl.SSLSocket):
+                conn.unwrap()
+    ftp.voidresp()
+
+
+def _download(
+    ftp: FTP, remote_path: str, local_path: str, size: int | None = None
+) -> None:
+    if size is None:
+        size = _remote_size(ftp, remote_path)
+    fd = os.open(local_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        if not size:
+            _download_stream(ftp, remote_path, fd)
+        else:
+            _download_into_mmap(ftp, remote_path, fd, size)
+    finally:
+        os.close(fd)
+
+
+def _download_with_pool(
+    pool: FTPConnectionPool,
+    remote_path: str,
+    local_path: str,
+    size: int | None,
+) -> None:
+    with pool.connection() as ftp:
+        _download(ftp, remote_path, local_path, size)
+
+
+def _list_dir_with_pool(pool: FTPConnectionPool, ftp_d: str) -> list[DirEntry]:
+    with pool.connection() as ftp:
+        entries = _list_dir(ftp, ftp_d)
+        unsized = [
+            posixpath.join(ftp_d, e.name)
+            for e in entries
+            if e.type != "dir" and e.size is None
         ]
-        if not os.path.exists(dest_dir):
-            raise Exception(f"No such file/dir in local fs: {dest_dir}")
-        while len(dirs) > 0:
-            dest_dir, ftp_d = dirs.pop(0)
-            filename = os.path.basename(ftp_d)
-            dest_dir = os.path.join(dest_dir, filename)
-            os.mkdir(dest_dir)
-            ftp.cwd(ftp_d)
-            for f in ftp.nlst():
-                filename = os.path.join(ftp.pwd(), f)
-                if not _is_file(ftp, filename):
-                    dirs.append((dest_dir, filename))
-                    continue
-                with open(os.path.join(dest_dir, f), "wb") as fd:
-                    ftp.retrbinary(f"RETR {f}", fd.write)
+        sizes = _remote_sizes(ftp, unsized) if unsized else {}
+    resolved = []
+    for e in entries:
+        if e.type == "dir" or e.size is not None:
+            resolved.append(e)
+            continue
+        path = posixpath.join(ftp_d, e.name)
+        size = sizes.get(path)
+        if e.type == "link":
+            # SIZE follows the link, failing means it isn't a plain file;
+            # directory links are skipped so cycles can't recurse forever
+            if size is None:
+                logging.info("Skipping symlink %s", path)
+                continue
+            e = e._replace(type="file")
+        resolved.append(e._replace(size=size))
+    return resolved
+
+
+@contextmanager
+def _cancel_on_error(*executors: "Executor") -> Generator[None, None, None]:
+    # fail now instead of after every queued transfer has run
+    try:
+        yield
+    except BaseException:
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def ftp_recursive_download(
+    ftp_path: str, dest: str, pool: FTPConnectionPool
+) -> None:
+    from concurrent.futures import (
+        FIRST_COMPLETED,
+        ThreadPoolExecutor,
+        as_completed,
+        wait,
+    )
+
+    # separate executors so a listing only waits for a free pool connection,
+    # not behind every queued download; both still share the same pool
+    lister = ThreadPoolExecutor(max_workers=pool.size)
+    downloader = ThreadPoolExecutor(max_workers=pool.size)
+    with lister, downloader, _cancel_on_error(lister, downloader):
+        listings: dict[Future[list[DirEntry]], tuple[str, str]] = {}
+        downloads: list[Future[None]] = []
+
+        def walk(dest_dir: str, ftp_d: str) -> None:
+            dest_dir = os.path.join(dest_dir, posixpath.basename(ftp_d))
+            os.makedirs(dest_dir, exist_ok=True)
+            future = lister.submit(_list_dir_with_pool, pool, ftp_d)
+            listings[future] = (dest_dir, ftp_d)
+
+        walk(dest, ftp_path)
+        while listings:
+            done, _ = wait(listings, return_when=FIRST_COMPLETED)
+            for future in done:
+                dest_dir, ftp_d = listings.pop(future)
+                for entry in future.result():
+                    filename = posixpath.join(ftp_d, entry.name)
+                    if entry.type == "dir":
+                        walk(dest_dir, filename)
+                        continue
+                    # 0 makes the worker stream the file without asking SIZE
+                    downloads.append(
+                        downloader.submit(
+                            _download_with_pool,
+                            pool,
+                            filename,
+                            os.path.join(dest_dir, entry.name),
+                            entry.size or 0,
+                        )
+                    )
+        for download in as_completed(downloads):
+            download.result()
+
+
+def _ftp_download(ui: UI, ftp_client: FTPClient) -> None:
+    ftp = ftp_client.ftp
+    inp = ui.prompt_user("ftp path: ", completer=ftp_client.completer)
+    ftp_path = _single_arg(inp, "ftp path")
+    # local dir where the ftp file must be downloaded, defaults to cwd
+    inp = ui.prompt_user("local path: ", completer=PathCompleter())
+    local_path = _single_arg(inp, "local path", default=_local_cwd())
+    dirname = posixpath.dirname(ftp_path)
+    filename = posixpath.basename(ftp_path)
+    dest_dir = os.path.abspath(os.path.join(_local_cwd(), local_path))
+    if (entry := _stat(ftp, ftp_path)) is None:
+        raise Exception(f"No such file/dir in FTP path: {dirname}")
+    if entry.type not in ("dir", "link"):
+        local_file = os.path.join(dest_dir, filename)
+        _download(ftp, ftp_path, local_file, entry.size)
+        return
+    if not os.path.exists(dest_dir):
+        raise Exception(f"No such file/dir in local fs: {dest_dir}")
+    ftp_recursive_download(ftp_path, dest_dir, ftp_client.pool)
+
+
+def ftp_download(args: argparse.Namespace) -> None:
+    _run_ftp_command(_ftp_download, args)
 
 
 def _upload(ftp: FTP, f: str, dest: str) -> None:
-    with open(f, "rb") as fd:
-        ftp.cwd(dest)
-        ftp.storbinary(f"STOR {os.path.basename(f)}", fd)
+    remote_path = posixpath.join(dest, os.path.basename(f))
+    with open(f, "rb", buffering=0) as fd:
+        # read ahead aggressively, then drop the pages so a one-shot upload
+        # doesn't evict the working set
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        ftp.voidcmd("TYPE I")
+        with ftp.transfercmd(f"STOR {remote_path}") as conn:
+            if isinstance(conn, ssl.SSLSocket):
+                # sendfile can't encrypt and would fall back to 8k sends
+                while buf := fd.read(TRANSFER_BLOCKSIZE):
+                    conn.sendall(buf)
+                conn.unwrap()
+            else:
+                conn.sendfile(fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    ftp.voidresp()
+
+
+def _upload_with_pool(pool: FTPConnectionPool, f: str, dest: str) -> None:
+    with pool.connection() as ftp:
+        _upload(ftp, f, dest)
+
+
+def _upload_all(pool: FTPConnectionPool, files: list[tuple[str, str]]) -> None:
+    from concurrent.futures import ThreadPoolExecutor
 
+    executor = ThreadPoolExecutor(max_workers=pool.size)
+    with executor, _cancel_on_error(executor):
+        list(executor.map(lambda item: _upload_with_pool(pool, *item), files))
+
+
+def ftp_recursive_upload(
+    ftp: FTP, f: str, dest: str, pool: FTPConnectionPool
+) -> None:
+    from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def ftp_recursive_upload(ftp: FTP, f: str, dest: str) -> None:
     if not os.path.isdir(f):
         raise Exception("ftp_recursive_upload() must be used only for dirs")
-    dirs = [
-        (f, dest),
-    ]
-    while len(dirs) > 0:
-        src_dir, dest_dir = dirs.pop(0)
-        ftp.cwd(dest_dir)
-        basename = os.path.basename(src_dir)
-        ftp.mkd(basename)
-        dest_dir = os.path.join(dest_dir, basename)
-        items = os.listdir(src_dir)
-        for item in items:
-            filename = os.path.join(src_dir, item)
-            if os.path.isdir(filename):
-                dirs.append(
-                    (
-                        filename,
-                        dest_dir,
+    # one listing tells whether the top dir exists; only existing dirs need
+    # to be listed again, anything below a fresh MKD is known to be empty
+    existing = {e.name for e in _list_dir(ftp, dest) if e.type == "dir"}
+    dirs = deque(
+        [
+            (f, dest, os.path.basename(f) in existing),
+        ]
+    )
+    executor = ThreadPoolExecutor(max_workers=pool.size)
+    with executor, _cancel_on_error(executor):
+        uploads: list[Future[None]] = []
+        while len(dirs) > 0:
+            src_dir, dest_dir, exists = dirs.popleft()
+            dest_dir = posixpath.join(dest_dir, os.path.basename(src_dir))
+            if exists:
+                existing = {
+                    e.name for e in _list_dir(ftp, dest_dir) if e.type == "dir"
+                }
+            else:
+                ftp.mkd(dest_dir)
+                existing = set()
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        dirs.append(
+                            (
+                                entry.path,
+                                dest_dir,
+                                entry.name in existing,
+                            )
+                        )
+                        continue
+                    # start uploading while the rest of the tree is created
+                    uploads.append(
+                        executor.submit(
+                            _upload_with_pool, pool, entry.path, dest_dir
+                        )
                     )
-                )
-                continue
-            _upload(ftp, filename, dest_dir)
+        for upload in as_completed(uploads):
+            upload.result()
 
 
-def ftp_upload(args: argparse.Namespace) -> None:
-    src_parser = argparse.ArgumentParser()
-    src_parser.add_argument("src", nargs="+", help="source file/directory")
-    dest_parser = argparse.ArgumentParser()
-    dest_parser.add_argument(
-        "dest",
-        help=(
-            "name of the destination directory where the files/directories "
-            + "must be uploaded"
-        ),
-    )
-    ui = cast(UI, args.ui)
+def _ftp_upload(ui: UI, ftp_client: FTPClient) -> None:
     inp = ui.prompt_user("src paths: ", completer=PathCompleter())
     logging.debug(f"src paths entered by user: {inp}")
-    src_args = src_parser.parse_args(split(inp))
-    with FTPClient(get_selected_ftp_config()) as ftp:
-        inp = ui.prompt_user("dest paths: ", completer=FTPPathCompleter(ftp))
-        logging.debug(f"dest paths entered by user: {inp}")
-        dst_args = dest_parser.parse_args(split(inp))
-        for f in src_args.src:
-            if os.path.isdir(f):
-                ftp_recursive_upload(ftp, f, dst_args.dest)
-                continue
-            _upload(ftp, f, dst_args.dest)
+    srcs = [os.path.join(_local_cwd(), f) for f in _split_args(inp)]
+    if not srcs:
+        raise Exception("Expected at least one source file/directory")
+    # destination directory where the files/directories must be uploaded
+    inp = ui.prompt_user("dest paths: ", completer=ftp_client.completer)
+    logging.debug(f"dest paths entered by user: {inp}")
+    dest = _single_arg(inp, "destination directory")
+    files: list[tuple[str, str]] = []
+    for f in srcs:
+        if os.path.isdir(f):
+            ftp_recursive_upload(ftp_client.ftp, f, dest, ftp_client.pool)
+            continue
+        files.append((f, dest))
+    if len(files) == 1:
+        # the logged in session is idle, don't open a pooled connection
+        _upload(ftp_client.ftp, *files[0])
+    elif files:
+        _upload_all(ftp_client.pool, files)
+
+
+def ftp_upload(args: argparse.Namespace) -> None:
+    _run_ftp_command(_ftp_upload, args)
 
 
 def test(args: argparse.Namespace) -> None:
-    with FTPClient(get_selected_ftp_config()) as ftp:
+    from prompt_toolkit import prompt
+
+    ftp_client = FTPClient(get_selected_ftp_config())
+    with ftp_client:
         logging.basicConfig(filename="test_ftp.log", level=logging.DEBUG)
-        completer = CompleterAdaptor(FTPPathCompleter(ftp))
+        completer = CompleterAdaptor(ftp_client.completer)
         print(
             prompt(
                 "ftp path: ",
-                completer=completer,
+                completer=cast("PTKCompleter", completer),
                 complete_while_typing=False,
             )
         )
@@ -533,6 +1476,7 @@ class FTPConfigDict(TypedDict):
     password: str
     host: str
     port: int
+    tls: NotRequired[bool]
 
 
 class State(TypedDict):
@@ -544,39 +1488,72 @@ class StateFileManager:
         self._state_file_path = state_file or os.path.expanduser(
             "~/.var/pyftp/state_file.json"
         )
-        state_file_dir = os.path.dirname(self._state_file_path)
-        if not os.path.exists(state_file_dir):
+        self._state: State | None = None
+
+    def _load_state(self) -> State:
+        try:
+            with open(self._state_file_path, "r", encoding="utf-8") as fd:
+                return json.load(fd)
+        except FileNotFoundError:
+            state_file_dir = os.path.dirname(self._state_file_path)
             os.makedirs(state_file_dir, exist_ok=True)
-        if not os.path.exists(self._state_file_path):
-            with open(self._state_file_path, "w", encoding="utf-8") as fd:
-                json.dump({"selected_server": {}}, fd)
+            state = cast(State, {"selected_server": {}})
+            self._write_state(state)
+            return state
+
+    def _write_state(self, state: State) -> None:
+        tmp_path = self._state_file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fd:
+            json.dump(state, fd, separators=(",", ":"))
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(tmp_path, self._state_file_path)
 
     def get_state(self) -> State:
-        with open(self._state_file_path, "r", encoding="utf-8") as fd:
-            state = json.load(fd)
-        return state
+        if self._state is None:
+            self._state = self._load_state()
+        return copy.deepcopy(self._state)
 
     def set_state(self, state: State) -> None:
-        with open(self._state_file_path, "w", encoding="utf-8") as fd:
-            json.dump(state, fd)
+        if state == self._state:
+            return
+        self._write_state(state)
+        self._state = copy.deepcopy(state)
+
+
+_state_file_manager: StateFileManager | None = None
+
+
+def get_state_file_manager() -> StateFileManager:
+    global _state_file_manager
+    if _state_file_manager is None:
+        _state_file_manager = StateFileManager()
+    return _state_file_manager
 
 
 def select_ftp_server(args: argparse.Namespace) -> None:
     ftpconfigs = args.config_parser.parse()
     choice = args.ui.display_choice_menu(
-        ls=list(map(lambda x: f"{x.name} ({x.host})", ftpconfigs)),
+        ls=[f"{c.name} ({c.host})" for c in ftpconfigs],
         title="FTP Servers:",
         prompt_str="Please choose FTP server: ",
     )
     ftpconfig = ftpconfigs[choice]
-    state_manager = StateFileManager()
+    state_manager = get_state_file_manager()
     state = state_manager.get_state()
-    state["selected_server"] = cast(FTPConfigDict, asdict(ftpconfig))
+    state["selected_server"] = {
+        "name": ftpconfig.name,
+        "username": ftpconfig.username,
+        "password": ftpconfig.password,
+        "host": ftpconfig.host,
+        "port": ftpconfig.port,
+        "tls": ftpconfig.tls,
+    }
     state_manager.set_state(state)
 
 
 def get_selected_ftp_config() -> FTPConfig | None:
-    state_manager = StateFileManager()
+    state_manager = get_state_file_manager()
     state = state_manager.get_state()
     server = state["selected_server"]
     if len(server) == 0:
@@ -587,33 +1564,359 @@ def get_selected_ftp_config() -> FTPConfig | None:
         password=server["password"],
         host=server["host"],
         port=server["port"],
+        tls=server.get("tls", False),
     )
 
 
+def _ftp_mkdir(ui: UI, ftp_client: FTPClient) -> None:
+    ftp = ftp_client.ftp
+    inp = ui.prompt_user("dir: ", completer=ftp_client.completer)
+    dirs = posixpath.split(_single_arg(inp, "ftp dir"))
+    for d in dirs:
+        if d == "/":
+            continue
+        new_dir = posixpath.join(ftp.pwd(), d)
+        try:
+            ftp.cwd(new_dir)
+        except Exception as exc:
+            logging.error(str(exc))
+            ftp.mkd(d)
+            ftp.cwd(new_dir)
+
+
 def ftp_mkdir(args: argparse.Namespace) -> None:
-    with FTPClient(get_selected_ftp_config()) as ftp:
-        mkdir_parser = argparse.ArgumentParser()
-        mkdir_parser.add_argument("dir", help="ftp dir to recursively create")
-        inp = args.ui.prompt_user("dir: ", completer=FTPPathCompleter(ftp))
-        args = mkdir_parser.parse_args(split(inp))
-        dirs = os.path.split(args.dir)
-        for d in dirs:
-            if d == "/":
+    _run_ftp_command(_ftp_mkdir, args)
+
+
+SHELL_COMMANDS: dict[str, FTPCommand] = {
+    "ls": _ftp_ls,
+    "download": _ftp_download,
+    "upload": _ftp_upload,
+    "mkdir": _ftp_mkdir,
+}
+
+
+class PrefilledUI(UI):
+    # answers the first prompts from the shell line, e.g. "ls /pub"
+    def __init__(self, ui: UI, answers: list[str]) -> None:
+        self._ui = ui
+        self._answers = deque(answers)
+        self.interrupted_in_prompt = False
+
+    def display_choice_menu(
+        self,
+        ls: list[str],
+        title: str = "",
+        prompt_str: str = "Enter your choice: ",
+    ) -> Choice:
+        return self._ui.display_choice_menu(ls, title, prompt_str)
+
+    def prompt_user(
+        self, prompt_str: str, completer: Completer | None = None
+    ) -> str:
+        if self._answers:
+            return self._answers.popleft()
+        try:
+            return self._ui.prompt_user(prompt_str, completer=completer)
+        except KeyboardInterrupt:
+            self.interrupted_in_prompt = True
+            raise
+
+    def print_error(self, msg: str) -> None:
+        self._ui.print_error(msg)
+
+    def print_msg(self, msg: str, color: str = "") -> None:
+        self._ui.print_msg(msg, color)
+
+
+def ftp_shell(args: argparse.Namespace) -> None:
+    ui = cast(UI, args.ui)
+    completer = WordCompleter([*SHELL_COMMANDS, "exit"])
+    ftp_client = FTPClient(get_selected_ftp_config())
+    with ftp_client:
+        while True:
+            try:
+                inp = ui.prompt_user("pyftp> ", completer=completer)
+            except (EOFError, KeyboardInterrupt):
+                break
+            cmd, _, rest = inp.strip().partition(" ")
+            rest = rest.strip()
+            if not cmd:
                 continue
-            new_dir = os.path.join(ftp.pwd(), d)
+            if cmd == "exit":
+                break
+            if (command := SHELL_COMMANDS.get(cmd)) is None:
+                ui.print_error(
+                    f"Unknown command: {cmd}. "
+                    + f"Available: {', '.join(SHELL_COMMANDS)}, exit"
+                )
+                continue
+            command_ui = PrefilledUI(ui, [rest] if rest else [])
             try:
-                ftp.cwd(new_dir)
+                command(command_ui, ftp_client)
+            except KeyboardInterrupt:
+                ui.print_error(f"{cmd} cancelled")
+                if not command_ui.interrupted_in_prompt:
+                    ftp_client.reconnect()
+            except error_perm as exc:
+                # the server refused the command and its reply has been read
+                logging.error(str(exc))
+                ui.print_error(str(exc))
             except Exception as exc:
                 logging.error(str(exc))
-                ftp.mkd(d)
-                ftp.cwd(new_dir)
+                ui.print_error(str(exc))
+                ftp_client.reconnect()
+            if cmd in ("upload", "mkdir"):
+                ftp_client.completer.clear_cache()
 
 
-def main() -> None:
-    logging.basicConfig(filename="test_ftp.log", level=logging.DEBUG)
-    parser = argparse.ArgumentParser(description="ftp client")
-    parser.set_defaults(func=lambda *x: parser.print_help())
-    sub_parsers = parser.add_subparsers(description="FTP commands")
+AGENT_SOCKET = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or os.path.expanduser("~/.var/pyftp"),
+    "pyftp.sock",
+)
+AGENT_KEEPALIVE_INTERVAL = 60
+
+
+class AgentChannel:
+    def __init__(self, sock: socket.socket) -> None:
+        self._file = sock.makefile("rw", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def send(self, **msg: Any) -> None:
+        with self._lock:
+            self._send(msg)
+
+    def recv(self) -> dict[str, Any]:
+        line = self._file.readline()
+        if not line:
+            raise EOFError("pyftp agent connection closed")
+        return cast(dict[str, Any], json.loads(line))
+
+    def request(self, **msg: Any) -> dict[str, Any]:
+        with self._lock:
+            self._send(msg)
+            return self.recv()
+
+    def _send(self, msg: dict[str, Any]) -> None:
+        self._file.write(json.dumps(msg, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+
+class AgentCompleter(Completer):
+    def __init__(self, channel: AgentChannel) -> None:
+        self._channel = channel
+
+    def get_completions(self, inp: str) -> list[Completion]:
+        msg = self._channel.request(op="complete", text=inp)
+        return [Completion(text, start) for text, start in msg["completions"]]
+
+
+class AgentUI(UI):
+    def __init__(self, channel: AgentChannel) -> None:
+        self._channel = channel
+
+    def display_choice_menu(
+        self,
+        ls: list[str],
+        title: str = "",
+        prompt_str: str = "Enter your choice: ",
+    ) -> Choice:
+        self._channel.send(op="menu", items=ls, title=title, prompt=prompt_str)
+        return cast(Choice, self._channel.recv()["choice"])
+
+    def prompt_user(
+        self, prompt_str: str, completer: Completer | None = None
+    ) -> str:
+        self._channel.send(
+            op="prompt", prompt=prompt_str, complete=completer is not None
+        )
+        try:
+            while (msg := self._channel.recv())["op"] == "complete":
+                completions = (
+                    completer.get_completions(msg["text"])
+                    if completer is not None
+                    else []
+                )
+                self._channel.send(
+                    op="completions",
+                    completions=[
+                        (c.text(), c.start_position()) for c in completions
+                    ],
+                )
+            return cast(str, msg["text"])
+        finally:
+            if completer is not None:
+                completer.cancel_pending()
+
+    def print_error(self, msg: str) -> None:
+        self._channel.send(op="error", msg=msg)
+
+    def print_msg(self, msg: str, color: str = "") -> None:
+        self._channel.send(op="msg", msg=msg, color=color)
+
+
+def _run_via_agent(command: FTPCommand, args: argparse.Namespace) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(AGENT_SOCKET)
+        except OSError:
+            return False
+        logging.debug("forwarding %s to agent", command.__name__)
+        ui = cast(UI, args.ui)
+        channel = AgentChannel(sock)
+        completer = AgentCompleter(channel)
+        ftpconfig = get_selected_ftp_config()
+        channel.send(
+            op="run",
+            command=command.__name__,
+            cwd=os.getcwd(),
+            config=None if ftpconfig is None else asdict(ftpconfig),
+        )
+        while (msg := channel.recv())["op"] != "done":
+            match msg["op"]:
+                case "prompt":
+                    text = ui.prompt_user(
+                        msg["prompt"], completer if msg["complete"] else None
+                    )
+                    channel.send(op="answer", text=text)
+                case "menu":
+                    choice = ui.display_choice_menu(
+                        msg["items"], msg["title"], msg["prompt"]
+                    )
+                    channel.send(op="answer", choice=choice)
+                case "msg":
+                    ui.print_msg(msg["msg"], msg["color"])
+                case "error":
+                    ui.print_error(msg["msg"])
+    return True
+
+
+class AgentClients:
+    # idle sessions per server; a busy one is never shared, so concurrent
+    # invocations for the same server each get their own control connection
+    def __init__(self) -> None:
+        self._idle: dict[FTPConfig, list[FTPClient]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, ftpconfig: FTPConfig) -> FTPClient:
+        with self._lock:
+            if idle := self._idle.get(ftpconfig):
+                return idle.pop()
+        ftp_client = FTPClient(ftpconfig)
+        ftp_client.__enter__()
+        return ftp_client
+
+    def release(self, ftpconfig: FTPConfig, ftp_client: FTPClient) -> None:
+        with self._lock:
+            self._idle.setdefault(ftpconfig, []).append(ftp_client)
+
+    def clear_caches(self, ftpconfig: FTPConfig) -> None:
+        with self._lock:
+            idle = list(self._idle.get(ftpconfig, []))
+        for ftp_client in idle:
+            ftp_client.completer.clear_cache()
+
+    def keepalive(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for ftpconfig, ftp_clients in idle.items():
+            for ftp_client in ftp_clients:
+                try:
+                    ftp_client.keepalive()
+                except Exception as exc:
+                    logging.debug("dropping dead connection: %s", exc)
+                    ftp_client.close()
+                    continue
+                self.release(ftpconfig, ftp_client)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for ftp_clients in idle.values():
+            for ftp_client in ftp_clients:
+                ftp_client.__exit__(None, None, None)
+
+
+def _serve_agent_request(conn: socket.socket, clients: AgentClients) -> None:
+    commands = {
+        command.__name__: command for command in SHELL_COMMANDS.values()
+    }
+    channel = AgentChannel(conn)
+    request = channel.recv()
+    try:
+        if (command := commands.get(request["command"])) is None:
+            raise Exception(f"Unknown agent command: {request['command']}")
+        if request["config"] is None:
+            raise Exception("No ftp server selected")
+        ftpconfig = FTPConfig(**request["config"])
+        ftp_client = clients.acquire(ftpconfig)
+        _thread_cwd.path = request["cwd"]
+        try:
+            command(AgentUI(channel), ftp_client)
+        except error_perm:
+            clients.release(ftpconfig, ftp_client)
+            raise
+        except BaseException:
+            # replies may be pending, a NOOP could even read a stale one
+            ftp_client.close()
+            raise
+        if command in (_ftp_upload, _ftp_mkdir):
+            ftp_client.completer.clear_cache()
+            clients.clear_caches(ftpconfig)
+        clients.release(ftpconfig, ftp_client)
+    except Exception as exc:
+        logging.error(str(exc))
+        channel.send(op="error", msg=str(exc))
+    channel.send(op="done")
+
+
+def _serve_agent_connection(conn: socket.socket, clients: AgentClients) -> None:
+    with conn:
+        try:
+            _serve_agent_request(conn, clients)
+        except Exception as exc:
+            logging.error("agent request failed: %s", exc)
+
+
+def ftp_agent(args: argparse.Namespace) -> None:
+    clients = AgentClients()
+    os.makedirs(os.path.dirname(AGENT_SOCKET), mode=0o700, exist_ok=True)
+    with suppress(FileNotFoundError):
+        os.unlink(AGENT_SOCKET)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(AGENT_SOCKET)
+        os.chmod(AGENT_SOCKET, 0o600)
+        server.listen()
+        next_keepalive = time.monotonic() + AGENT_KEEPALIVE_INTERVAL
+        try:
+            while True:
+                # NOOP on a fixed schedule; a busy agent serving one server
+                # must not let the connections to the others time out
+                if (now := time.monotonic()) >= next_keepalive:
+                    clients.keepalive()
+                    next_keepalive = now + AGENT_KEEPALIVE_INTERVAL
+                server.settimeout(next_keepalive - now)
+                try:
+                    conn, _ = server.accept()
+                except TimeoutError:
+                    continue
+                conn.settimeout(None)
+                # a client sitting at a prompt must not hold up the others
+                threading.Thread(
+                    target=_serve_agent_connection,
+                    args=(conn, clients),
+                    daemon=True,
+                ).start()
+        finally:
+            clients.close()
+            with suppress(FileNotFoundError):
+                os.unlink(AGENT_SOCKET)
+
+
+SubParsers: TypeAlias = "argparse._SubParsersAction[argparse.ArgumentParser]"
+
+
+def _add_select_parser(sub_parsers: SubParsers) -> None:
     select = sub_parsers.add_parser(
         "select",
         help=(
@@ -627,25 +1930,87 @@ def main() -> None:
         # config_parser=FileZillaFTPConfigParser("/home/jprajwal/onedrive/workspace/docs/FileZilla.xml"),
         ui=PromptToolkitUI(),
     )
+
+
+def _add_ls_parser(sub_parsers: SubParsers) -> None:
     ls = sub_parsers.add_parser(
         "ls", help="list files/directories in specified file/directory"
     )
     ls.set_defaults(func=ftp_ls, ui=PromptToolkitUI())
+
+
+def _add_download_parser(sub_parsers: SubParsers) -> None:
     download = sub_parsers.add_parser(
         "download", help="download files/directories"
     )
     download.set_defaults(func=ftp_download, ui=PromptToolkitUI())
+
+
+def _add_upload_parser(sub_parsers: SubParsers) -> None:
     upload = sub_parsers.add_parser("upload", help="upload files/directories")
     upload.set_defaults(func=ftp_upload, ui=PromptToolkitUI())
+
+
+def _add_test_parser(sub_parsers: SubParsers) -> None:
     t = sub_parsers.add_parser("test", help="test autocompletion")
     t.set_defaults(func=test)
+
+
+def _add_mkdir_parser(sub_parsers: SubParsers) -> None:
     mkdir = sub_parsers.add_parser(
         "mkdir", help="recursively create specified dirs in ftp"
     )
     mkdir.set_defaults(func=ftp_mkdir, ui=PromptToolkitUI())
+
+
+def _add_shell_parser(sub_parsers: SubParsers) -> None:
+    shell = sub_parsers.add_parser(
+        "shell",
+        help="interactive shell reusing one ftp connection for all commands",
+    )
+    shell.set_defaults(func=ftp_shell, ui=PromptToolkitUI())
+
+
+def _add_agent_parser(sub_parsers: SubParsers) -> None:
+    agent = sub_parsers.add_parser(
+        "agent",
+        help="keep ftp connections open for other pyftp invocations to reuse",
+    )
+    agent.set_defaults(func=ftp_agent)
+
+
+SUBCOMMAND_PARSERS: dict[str, Callable[[SubParsers], None]] = {
+    "select": _add_select_parser,
+    "ls": _add_ls_parser,
+    "download": _add_download_parser,
+    "upload": _add_upload_parser,
+    "test": _add_test_parser,
+    "mkdir": _add_mkdir_parser,
+    "shell": _add_shell_parser,
+    "agent": _add_agent_parser,
+}
+
+
+def main() -> None:
+    logging.basicConfig(filename="test_ftp.log", level=logging.DEBUG)
+    parser = argparse.ArgumentParser(description="ftp client")
+    parser.set_defaults(func=lambda *x: parser.print_help())
+    sub_parsers = parser.add_subparsers(description="FTP commands")
+    # only build the invoked subcommand; help and typos need all of them
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if (add_parser := SUBCOMMAND_PARSERS.get(cmd)) is not None:
+        add_parser(sub_parsers)
+    else:
+        for add_parser in SUBCOMMAND_PARSERS.values():
+            add_parser(sub_parsers)
     args = parser.parse_args()
     args.func(args)
 
 
+def agent_main() -> None:
+    logging.basicConfig(filename="test_ftp.log", level=logging.DEBUG)
+    ftp_agent(argparse.Namespace())
+
+
 if __name__ == "__main__":
     main()